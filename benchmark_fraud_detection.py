@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the fraud detection hot paths
+Run with: python3 benchmark_fraud_detection.py [--only codec|handlers|state|geo]
+Only the `handlers` suite imports the Flask service.
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import fast_codec
+from fast_codec import TransactionRecord
+from geo_index import GeoIndex
+from rule_state_store import VelocityStateStore, record_velocity
+
+SAMPLE_EVENT = {
+    "event_id": "evt_bench_001",
+    "ts": "2025-01-15T14:54:34.967Z",
+    "transaction_id": "CC-7790920712",
+    "card_id": "CC-7790920712",
+    "customer_id": "CUST-004038",
+    "merchant_id": "MERCH-000666",
+    "card_number": "****-****-****-3565",
+    "merchant_name": "Shell Gas",
+    "category": "Gas",
+    "amount": 361.23,
+    "currency": "USD",
+    "city": "Los Angeles",
+    "state": "PA",
+    "zip": "54280",
+    "status": "approved",
+    "fraud_flag1": False,
+    "fraud_flag2": False,
+    "fraud_flag3": False
+}
+
+SAMPLE_RESULT = {
+    "risk": "LIKELY_FRAUD",
+    "score": 0.74,
+    "explanation": "Unusually high gas station transaction; High-value transaction in major city",
+    "flags": {
+        "mismatch": False,
+        "expected": "Gas",
+        "geo_invalid": True,
+        "amount_high": True,
+        "velocity_burst": False,
+        "high_amount": False
+    }
+}
+
+
+def _bench(name: str, fn: Callable[[], None], iterations: int) -> float:
+    """Run `fn` `iterations` times and print the throughput."""
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    rate = iterations / elapsed if elapsed else float("inf")
+    print(f"  {name:<40} {rate:>12,.0f} ops/s  {elapsed * 1e6 / iterations:>8.2f} us/op")
+    return rate
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Serialization
+
+
+def bench_codec(iterations: int, batch_size: int) -> Dict[str, float]:
+    raw = json.dumps(SAMPLE_EVENT).encode("utf-8")
+
+    def baseline_single():
+        data = json.loads(raw)
+        json.dumps(SAMPLE_RESULT, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        return data
+
+    def fast_single():
+        TransactionRecord.from_dict(fast_codec.loads(raw))
+        fast_codec.encode_result(SAMPLE_RESULT)
+
+    batch = [SAMPLE_EVENT] * batch_size
+    raw_array = json.dumps(batch).encode("utf-8")
+    raw_frames = fast_codec.encode_frames([json.dumps(e).encode("utf-8") for e in batch])
+
+    def baseline_batch():
+        events = json.loads(raw_array)
+        json.dumps([SAMPLE_RESULT] * len(events), separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+    def fast_batch_array():
+        events = fast_codec.loads(raw_array)
+        records = [TransactionRecord.from_dict(e) for e in events]
+        fast_codec.encode_json_array([fast_codec.encode_result(SAMPLE_RESULT) for _ in records])
+
+    def fast_batch_frames():
+        records = [TransactionRecord.from_dict(fast_codec.loads(f)) for f in fast_codec.iter_frames(raw_frames)]
+        fast_codec.encode_frames([fast_codec.encode_result(SAMPLE_RESULT) for _ in records])
+
+    print(f"Serialization only, no Flask (single event, batch of {batch_size})")
+    batch_iterations = max(1, iterations // batch_size)
+    return {
+        "baseline_single": _bench("stdlib json loads + dumps", baseline_single, iterations),
+        "fast_single": _bench("fast codec", fast_single, iterations),
+        "baseline_batch": _bench("batch: stdlib json array", baseline_batch, batch_iterations),
+        "fast_batch_array": _bench("batch: fast codec, json array", fast_batch_array, batch_iterations),
+        "fast_batch_frames": _bench("batch: fast codec, binary frames", fast_batch_frames, batch_iterations)
+    }
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Flask handlers: the original get_json/jsonify handler against the fast-codec routes
+
+
+def bench_handlers(iterations: int, batch_size: int) -> Dict[str, float]:
+    from flask import jsonify, request
+
+    import fraud_detection_service as service
+
+    def legacy_analyze():
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "No transaction data provided"}), 400
+        return jsonify(service.analyze_transaction(data))
+
+    def legacy_batch():
+        return jsonify([service.analyze_transaction(event) for event in request.get_json()])
+
+    service.app.add_url_rule("/bench/legacy-analyze", "bench_legacy_analyze", legacy_analyze, methods=["POST"])
+    service.app.add_url_rule("/bench/legacy-batch", "bench_legacy_batch", legacy_batch, methods=["POST"])
+    client = service.app.test_client()
+
+    raw = json.dumps(SAMPLE_EVENT).encode("utf-8")
+    batch = [SAMPLE_EVENT] * batch_size
+    raw_array = json.dumps(batch).encode("utf-8")
+    raw_frames = fast_codec.encode_frames([json.dumps(e).encode("utf-8") for e in batch])
+
+    def post(path: str, body: bytes, content_type: str = "application/json"):
+        return lambda: client.post(path, data=body, content_type=content_type)
+
+    print(f"Flask handlers via test client (single event, batch of {batch_size})")
+    handler_iterations = max(1, iterations // 10)
+    batch_iterations = max(1, handler_iterations // batch_size)
+    return {
+        "legacy_single": _bench("get_json + jsonify (original)", post("/bench/legacy-analyze", raw), handler_iterations),
+        "fast_single": _bench("/analyze (fast codec)", post("/analyze", raw), handler_iterations),
+        "legacy_batch": _bench("batch: get_json + jsonify", post("/bench/legacy-batch", raw_array), batch_iterations),
+        "fast_batch_array": _bench("/analyze/batch, json array", post("/analyze/batch", raw_array), batch_iterations),
+        "fast_batch_frames": _bench("/analyze/batch, binary frames",
+                                    post("/analyze/batch", raw_frames, fast_codec.FRAME_MIMETYPE), batch_iterations)
+    }
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Durable velocity state
+
+
+def bench_state(iterations: int, cards: int) -> Dict[str, float]:
+    window_ms = 2000
+    results = {}
+    print(f"Velocity state ({cards} card tails)")
+
+    state: Dict[str, List[int]] = {}
+    counter = iter(range(10 ** 12))
+
+    def in_memory():
+        i = next(counter)
+        record_velocity(state, str(i % cards).zfill(4), i, window_ms)
+
+    results["memory"] = _bench("in-memory only (current path)", in_memory, iterations)
+
+    # Stamps start at the wall clock so snapshot retention keeps every card
+    base_ms = int(time.time() * 1000)
+
+    for policy in ("never", "interval", "always"):
+        directory = tempfile.mkdtemp(prefix="velocity-bench-")
+        try:
+            store = VelocityStateStore(directory, window_ms, fsync=policy, snapshot_interval_s=3600)
+            store.recover()
+            counter = iter(range(10 ** 12))
+
+            def durable():
+                i = next(counter)
+                store.observe(str(i % cards).zfill(4), base_ms + i)
+
+            n = iterations if policy != "always" else max(1, iterations // 50)
+            results[f"wal_{policy}"] = _bench(f"WAL, fsync={policy}", durable, n)
+            store.snapshot()
+            store.close()
+
+            start = time.perf_counter()
+            recovered = VelocityStateStore(directory, window_ms)
+            recovered.recover()
+            results[f"recover_snapshot_{policy}_ms"] = (time.perf_counter() - start) * 1000
+            recovered.close(snapshot=False)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    # Worst case: crash before any snapshot, so the whole WAL is replayed
+    directory = tempfile.mkdtemp(prefix="velocity-bench-")
+    try:
+        store = VelocityStateStore(directory, window_ms, fsync="never", snapshot_interval_s=3600)
+        store.recover()
+        for i in range(iterations):
+            store.observe(str(i % cards).zfill(4), base_ms + i)
+        store.close(snapshot=False)
+
+        start = time.perf_counter()
+        recovered = VelocityStateStore(directory, window_ms)
+        recovered.recover()
+        results["recover_wal_ms"] = (time.perf_counter() - start) * 1000
+        recovered.close(snapshot=False)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(f"  {'recovery from snapshot':<40} {results['recover_snapshot_never_ms']:>12.2f} ms")
+    print(f"  {f'recovery replaying {iterations} WAL records':<40} {results['recover_wal_ms']:>12.2f} ms")
+    return results
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Geo validation
+
+
+def bench_geo(iterations: int) -> Dict[str, float]:
+    bad_pairs = {("Los Angeles", "PA"), ("Phoenix", "OH"), ("New York", "FL")}
+    start = time.perf_counter()
+    index = GeoIndex.load()
+    load_ms = (time.perf_counter() - start) * 1000
+    city, state, zip_code = SAMPLE_EVENT["city"], SAMPLE_EVENT["state"], SAMPLE_EVENT["zip"]
+
+    print("Geo validation")
+    results = {
+        "pairs": _bench("hand-maintained pair set (current path)", lambda: (city, state) in bad_pairs, iterations),
+        "index": _bench("geo index (zip)", lambda: index.is_mismatch(city, state, zip_code), iterations),
+        "load_ms": load_ms
+    }
+    print(f"  {'index load':<40} {load_ms:>12.2f} ms")
+    return results
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], Dict[str, float]]] = {
+    "codec": lambda args: bench_codec(args.iterations, args.batch_size),
+    "handlers": lambda args: bench_handlers(args.iterations, args.batch_size),
+    "state": lambda args: bench_state(args.iterations, args.cards),
+    "geo": lambda args: bench_geo(args.iterations)
+}
+
+
+def main(argv: List[str] = None) -> Dict[str, Dict[str, float]]:
+    parser = argparse.ArgumentParser(description="Benchmark fraud detection hot paths")
+    parser.add_argument("--iterations", "-n", type=int, default=50000, help="Operations per benchmark")
+    parser.add_argument("--batch-size", type=int, default=100, help="Events per batch request")
+    parser.add_argument("--cards", type=int, default=10000, help="Distinct card tails for state benchmarks")
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), action="append", help="Run only these benchmarks")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        results[name] = BENCHMARKS[name](args)
+        print()
+    return results
+
+
+if __name__ == "__main__":
+    main()
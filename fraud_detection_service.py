@@ -5,6 +5,8 @@ Supports both environment variables and AWS SSM parameters
 """
 
 import os
+import atexit
+import hashlib
 import json
 import time
 import logging
@@ -12,10 +14,16 @@ import random
 import boto3
 from datetime import datetime
 from typing import Dict, Any, Optional
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
+import fast_codec
+from fast_codec import FRAME_MIMETYPE, TransactionRecord
+from geo_index import DEFAULT_DATA_DIR, GeoIndex
+from insight_broadcaster import InsightBroadcaster, parse_risk_filter
+from rule_state_store import VelocityStateStore, record_velocity
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -96,6 +104,10 @@ MODEL_ID = os.getenv("MODEL_ID", "us.anthropic.claude-3-7-sonnet-20250219-v1:0")
 MCP_ENDPOINT = mcp_config.get('MCP_ENDPOINT', 'https://bedrock.amazonaws.com')
 MCP_BEARER = mcp_config.get('AWS_BEARER_TOKEN_BEDROCK')
 
+# Deterministic mode derives the AI noise term from the event instead of the global RNG
+DETERMINISTIC_SCORING = os.getenv("SCORING_DETERMINISTIC", "false").lower() in ("1", "true", "yes")
+SCORING_SEED = os.getenv("SCORING_SEED", "")
+
 # ────────────────────────────────────────────────────────────────────────────────
 # Fraud Detection Rules and Constants
 
@@ -122,13 +134,64 @@ GEO_BAD_PAIRS = {
     ("San Jose","IL"), ("Houston","NC")
 }
 
+# National zip->state and city->states index; GEO_BAD_PAIRS still applies if it fails to load
+try:
+    geo_index: Optional[GeoIndex] = GeoIndex.load(
+        os.getenv("GEO_DATA_DIR", DEFAULT_DATA_DIR),
+        cities_complete=os.getenv("GEO_CITY_TABLE_COMPLETE", "false").lower() in ("1", "true", "yes")
+    )
+except Exception as e:
+    logger.warning(f"Could not load geo index: {e}")
+    geo_index = None
+
 # Velocity tracking
 VELOCITY_WINDOW_MS = 2000
 _recent_by_card_tail: Dict[str, list] = {}
+state_store: Optional[VelocityStateStore] = None
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
+def _event_hash(event: Dict[str, Any]) -> int:
+    """Stable 64-bit hash of the event's identity, salted by SCORING_SEED."""
+    key = event.get("event_id") or "|".join(str(event.get(k, "")) for k in ("ts", "card_number", "merchant_name", "amount"))
+    digest = hashlib.blake2b(f"{SCORING_SEED}:{key}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+def _fallback_time_ms(event: Dict[str, Any]) -> int:
+    """Velocity timestamp for events without a usable `ts`.
+    
+    Deterministic mode can't use the wall clock, so it places the event at a
+    fixed pseudo-time derived from its hash (which in practice never lands
+    inside another event's velocity window).
+    """
+    if DETERMINISTIC_SCORING:
+        return _event_hash(event) % 2**40
+    return _now_ms()
+
+def init_rule_state() -> None:
+    """Back velocity state with a durable WAL + snapshot store when RULE_STATE_DIR is set."""
+    global state_store, _recent_by_card_tail
+    directory = os.getenv("RULE_STATE_DIR")
+    if not directory:
+        return
+    
+    try:
+        store = VelocityStateStore(
+            directory,
+            VELOCITY_WINDOW_MS,
+            fsync=os.getenv("RULE_STATE_FSYNC", "interval"),
+            fsync_interval_ms=int(os.getenv("RULE_STATE_FSYNC_INTERVAL_MS", 200)),
+            snapshot_interval_s=float(os.getenv("RULE_STATE_SNAPSHOT_SECONDS", 30)),
+            retention_ms=int(os.getenv("RULE_STATE_RETENTION_MS", 300000))
+        )
+        _recent_by_card_tail = store.recover()
+    except Exception as e:
+        logger.warning(f"RULE_STATE_DIR is set but velocity state is not persisted: {e}")
+        return
+    state_store = store
+    atexit.register(state_store.close)
+
 # ────────────────────────────────────────────────────────────────────────────────
 # Fraud Detection Functions
 
@@ -139,8 +202,9 @@ def classify_rules(event: Dict[str, Any]) -> Dict[str, Any]:
     amount = float(event.get("amount", 0))
     city = str(event.get("city",""))
     state = str(event.get("state",""))
+    zip_code = event.get("zip","")
     card_number = str(event.get("card_number",""))
-    ts_str = event.get("ts") or datetime.utcnow().isoformat()
+    ts_str = event.get("ts") or ("" if DETERMINISTIC_SCORING else datetime.utcnow().isoformat())
 
     # 1) Merchant/category mismatch
     expected = None
@@ -150,8 +214,8 @@ def classify_rules(event: Dict[str, Any]) -> Dict[str, Any]:
             break
     mismatch = bool(expected and expected != category)
 
-    # 2) Geographic invalid pairs
-    geo_invalid = (city, state) in GEO_BAD_PAIRS
+    # 2) Geographic invalid pairs (city or zip not in the stated state)
+    geo_invalid = (city, state) in GEO_BAD_PAIRS or bool(geo_index and geo_index.is_mismatch(city, state, zip_code))
 
     # 3) Amount high for category
     cap = AMOUNT_CAP.get(category, 300)
@@ -160,14 +224,14 @@ def classify_rules(event: Dict[str, Any]) -> Dict[str, Any]:
     # 4) Velocity burst (same card tail within 2s)
     card_tail = card_number[-4:] if len(card_number) >= 4 else card_number
     try:
-        t = int(datetime.fromisoformat(ts_str.replace("Z","")).timestamp() * 1000) if "T" in ts_str else _now_ms()
+        t = int(datetime.fromisoformat(ts_str.replace("Z","")).timestamp() * 1000) if "T" in ts_str else _fallback_time_ms(event)
     except:
-        t = _now_ms()
+        t = _fallback_time_ms(event)
     
-    lst = _recent_by_card_tail.setdefault(card_tail, [])
-    while lst and (t - lst[0]) > VELOCITY_WINDOW_MS:
-        lst.pop(0)
-    lst.append(t)
+    if state_store:
+        lst = state_store.observe(card_tail, t)
+    else:
+        lst = record_velocity(_recent_by_card_tail, card_tail, t, VELOCITY_WINDOW_MS)
     velocity_burst = len(lst) >= 3
 
     # 5) High amount transactions
@@ -208,6 +272,10 @@ def classify_rules(event: Dict[str, Any]) -> Dict[str, Any]:
         }
     }
 
+def _event_noise(event: Dict[str, Any]) -> float:
+    """Uniform noise in [-0.1, 0.1] seeded by the event's identity."""
+    return -0.1 + 0.2 * (_event_hash(event) / 2**64)
+
 def llm_refine_enhanced(event: Dict[str, Any], flags: Dict[str, Any]) -> Dict[str, Any]:
     """Enhanced AI analysis with MCP integration capability."""
     
@@ -257,7 +325,7 @@ def llm_refine_enhanced(event: Dict[str, Any], flags: Dict[str, Any]) -> Dict[st
         explanations.append("High-value transaction in major city")
     
     # Random AI factor (simulating model uncertainty)
-    ai_score += random.uniform(-0.1, 0.1)
+    ai_score += _event_noise(event) if DETERMINISTIC_SCORING else random.uniform(-0.1, 0.1)
     ai_score = max(0.0, min(1.0, ai_score))
     
     explanation = "; ".join(explanations) if explanations else "AI analysis completed"
@@ -316,21 +384,94 @@ def analyze_transaction(event: Dict[str, Any]) -> Dict[str, Any]:
 app = Flask(__name__)
 CORS(app)
 
+# SSE fan-out: every scored result is pushed once to all connected dashboards
+broadcaster = InsightBroadcaster(
+    buffer_size=int(os.getenv("SSE_BUFFER_SIZE", 256)),
+    heartbeat_seconds=float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+)
+
+def _publish_insight(event: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """Push a scored event to SSE subscribers in the frontend `Insight` shape."""
+    if not broadcaster.subscriber_count:
+        return
+    broadcaster.publish({
+        **event,
+        "risk": result["risk"],
+        "score": result["score"],
+        "explanation": result["explanation"],
+        "ai_flags": result["flags"]
+    })
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     """Analyze a transaction for fraud risk."""
     try:
-        data = request.get_json()
-        if not data:
+        raw = request.get_data()
+        try:
+            data = fast_codec.loads(raw) if raw else None
+        except ValueError as e:
+            return jsonify({"error": f"Invalid transaction JSON: {e}"}), 400
+        if not isinstance(data, dict) or not data:
             return jsonify({"error": "No transaction data provided"}), 400
         
-        result = analyze_transaction(data)
-        return jsonify(result)
+        result = analyze_transaction(TransactionRecord.from_dict(data))
+        _publish_insight(data, result)
+        return Response(fast_codec.encode_result(result), mimetype="application/json")
     
     except Exception as e:
         logger.error(f"API error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """Analyze a batch of transactions sent as a JSON array or length-prefixed frames."""
+    try:
+        raw = request.get_data()
+        framed = request.mimetype == FRAME_MIMETYPE
+        try:
+            if framed:
+                events = [fast_codec.loads(frame) for frame in fast_codec.iter_frames(raw)]
+            else:
+                events = fast_codec.loads(raw) if raw else None
+        except ValueError as e:
+            return jsonify({"error": f"Invalid transaction batch: {e}"}), 400
+        if not isinstance(events, list) or not events:
+            return jsonify({"error": "No transaction batch provided"}), 400
+        if not all(isinstance(event, dict) for event in events):
+            return jsonify({"error": "Every batch item must be a transaction object"}), 400
+        
+        encoded = []
+        for event in events:
+            result = analyze_transaction(TransactionRecord.from_dict(event))
+            _publish_insight(event, result)
+            encoded.append(fast_codec.encode_result(result))
+        
+        if framed:
+            return Response(fast_codec.encode_frames(encoded), mimetype=FRAME_MIMETYPE)
+        return Response(fast_codec.encode_json_array(encoded), mimetype="application/json")
+    
+    except Exception as e:
+        logger.error(f"API error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/ws', methods=['GET'])
+def stream_insights():
+    """Stream scored insights as Server-Sent Events (optional ?risk=REVIEW,LIKELY_FRAUD).
+    
+    `?format=frames` switches to length-prefixed binary frames.
+    """
+    try:
+        risks = parse_risk_filter(request.args.get("risk"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    binary = request.args.get("format") == "frames"
+    return Response(
+        stream_with_context(broadcaster.stream(risks, binary)),
+        mimetype=FRAME_MIMETYPE if binary else "text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint."""
@@ -338,7 +479,10 @@ def health():
         "status": "healthy", 
         "service": "fraud-detection-enhanced",
         "mcp_configured": bool(MCP_BEARER and MCP_BEARER != "your-token-here"),
-        "mcp_endpoint": MCP_ENDPOINT
+        "mcp_endpoint": MCP_ENDPOINT,
+        "deterministic_scoring": DETERMINISTIC_SCORING,
+        "sse_clients": broadcaster.subscriber_count,
+        "rule_state": state_store.stats if state_store else None
     })
 
 @app.route('/config', methods=['GET'])
@@ -351,9 +495,14 @@ def get_config():
         "ssm_available": config_manager.ssm_client is not None
     })
 
+if __name__ != "__main__":
+    # Imported by a WSGI server or tool; the script entry point below handles its own init
+    init_rule_state()
+
 if __name__ == "__main__":
     # CLI mode for testing
     if len(os.sys.argv) > 1 and os.sys.argv[1] == "test":
+        init_rule_state()
         import argparse
         parser = argparse.ArgumentParser(description="Test fraud detection")
         parser.add_argument("--event", "-e", type=str, required=True, help="JSON event")
@@ -363,8 +512,15 @@ if __name__ == "__main__":
         print(json.dumps(result, indent=2))
     else:
         # Start Flask server
+        use_reloader = os.getenv("FRAUD_SERVICE_RELOAD", "true").lower() in ("1", "true", "yes")
+        # The reloader's parent only watches files and re-runs this script in a child that serves
+        if use_reloader and os.getenv("WERKZEUG_RUN_MAIN") != "true":
+            if os.getenv("RULE_STATE_DIR"):
+                logger.info("Reloader parent process: velocity state is opened by the serving child")
+        else:
+            init_rule_state()
         port = int(os.getenv("FRAUD_SERVICE_PORT", 5001))
         logger.info(f"Starting enhanced fraud detection service on port {port}")
         logger.info(f"MCP Endpoint: {MCP_ENDPOINT}")
         logger.info(f"MCP Configured: {bool(MCP_BEARER and MCP_BEARER != 'your-token-here')}")
-        app.run(host="0.0.0.0", port=port, debug=True)
+        app.run(host="0.0.0.0", port=port, debug=True, use_reloader=use_reloader)
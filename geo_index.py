@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Compact geographic validation index
+zip->state and city->valid-states tables loaded from local reference CSVs
+"""
+
+import csv
+import logging
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from typing import FrozenSet, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+ZIP_FILE = "zip_states.csv"
+CITY_FILE = "city_states.csv"
+
+_ZIP_SPACE = 100000
+_CITY_PREFIXES = {"st": "saint", "ste": "sainte", "ft": "fort", "mt": "mount"}
+_PUNCTUATION = str.maketrans({".": "", "'": "", "-": " ", ",": " "})
+
+
+@lru_cache(maxsize=4096)
+def normalize_city(raw: str) -> str:
+    """Canonical, interned form of a city name ("St. Louis" -> "saint louis")."""
+    words = raw.translate(_PUNCTUATION).casefold().split()
+    if words and words[0] in _CITY_PREFIXES:
+        words[0] = _CITY_PREFIXES[words[0]]
+    return sys.intern(" ".join(words))
+
+
+def normalize_zip(raw) -> Optional[int]:
+    """First five digits of a ZIP or ZIP+4 as an int, or None if malformed."""
+    digits = str(raw).zfill(5) if isinstance(raw, int) else str(raw).strip()[:5]
+    return int(digits) if len(digits) == 5 and digits.isdigit() else None
+
+
+class GeoIndex:
+    """Array-backed zip and city lookups.
+
+    Zips map through a flat 100k-entry byte table (O(1), ~100 KB); cities are
+    a sorted tuple of interned names with a parallel array of 64-bit state
+    bitmasks (binary search, 8 bytes per city plus the shared strings).
+
+    A city table only proves a mismatch if it lists every state that has a
+    place with that name, so city checks are off unless `cities_complete`
+    says the table is a full national gazetteer.
+    """
+
+    def __init__(self, states: Tuple[str, ...], zip_table: bytearray,
+                 city_names: Tuple[str, ...], city_masks: array, cities_complete: bool = False):
+        self.states = states
+        self.cities_complete = cities_complete
+        self._state_bits = {state: 1 << i for i, state in enumerate(states)}
+        self._zip_table = zip_table
+        self._city_names = city_names
+        self._city_masks = city_masks
+
+    @classmethod
+    def load(cls, data_dir: str = DEFAULT_DATA_DIR, cities_complete: bool = False) -> "GeoIndex":
+        """Build the index from `zip_states.csv` and `city_states.csv` in `data_dir`."""
+        with open(os.path.join(data_dir, ZIP_FILE), newline="") as f:
+            zip_rows = [(int(r["zip_start"]), int(r["zip_end"]), r["state"].strip().upper()) for r in csv.DictReader(f)]
+        with open(os.path.join(data_dir, CITY_FILE), newline="") as f:
+            city_rows = [(normalize_city(r["city"]), r["state"].strip().upper()) for r in csv.DictReader(f)]
+
+        states = tuple(sorted({s for _, _, s in zip_rows} | {s for _, s in city_rows}))
+        if len(states) > 64:
+            raise ValueError(f"Geo reference data has {len(states)} states; at most 64 are supported")
+        state_ids = {state: i for i, state in enumerate(states)}
+
+        # Byte 0 means unknown, so state ids are stored offset by one
+        zip_table = bytearray(_ZIP_SPACE)
+        for start, end, state in zip_rows:
+            zip_table[start:end + 1] = bytes([state_ids[state] + 1]) * (end - start + 1)
+
+        masks = {}
+        for city, state in city_rows:
+            masks[city] = masks.get(city, 0) | (1 << state_ids[state])
+        city_names = tuple(sorted(masks))
+        city_masks = array("Q", (masks[name] for name in city_names))
+
+        index = cls(states, zip_table, city_names, city_masks, cities_complete)
+        logger.info(f"Loaded geo index: {len(zip_rows)} zip ranges, {len(city_names)} cities, {len(states)} states"
+                    f" (city checks {'on' if cities_complete else 'off'})")
+        return index
+
+    def zip_state(self, raw_zip) -> Optional[str]:
+        z = normalize_zip(raw_zip)
+        if z is None:
+            return None
+        state_id = self._zip_table[z]
+        return self.states[state_id - 1] if state_id else None
+
+    def _city_mask(self, city: str) -> int:
+        key = normalize_city(city)
+        i = bisect_left(self._city_names, key)
+        if i < len(self._city_names) and self._city_names[i] == key:
+            return self._city_masks[i]
+        return 0
+
+    def city_states(self, city: str) -> FrozenSet[str]:
+        mask = self._city_mask(city)
+        return frozenset(state for i, state in enumerate(self.states) if mask >> i & 1)
+
+    def is_mismatch(self, city: str, state: str, raw_zip=None) -> bool:
+        """True when the zip (or, with a complete city table, the city) does not belong to `state`.
+
+        Unknown cities, zips and states are never flagged.
+        """
+        bit = self._state_bits.get(state.strip().upper())
+        if not bit:
+            return False
+        if self.cities_complete and city:
+            mask = self._city_mask(city)
+            if mask and not mask & bit:
+                return True
+        if raw_zip not in (None, ""):
+            zip_state = self.zip_state(raw_zip)
+            if zip_state and self._state_bits[zip_state] != bit:
+                return True
+        return False
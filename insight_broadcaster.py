@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events fan-out for scored insights
+Each result is encoded once and shared by every subscriber's bounded buffer
+"""
+
+import json
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, Optional, Set
+
+from fast_codec import encode_frame
+
+logger = logging.getLogger(__name__)
+
+RISK_LEVELS = ("OK", "REVIEW", "LIKELY_FRAUD")
+HEARTBEAT_FRAME = b": heartbeat\n\n"
+BINARY_HEARTBEAT_FRAME = encode_frame(b"")
+
+
+def encode_payload(insight: Dict[str, Any]) -> bytes:
+    return json.dumps(insight, separators=(",", ":"), default=str).encode("utf-8")
+
+
+_SSE_LINE_BREAKS = ("\r", "\n", "\0")
+
+
+def encode_sse(insight: Dict[str, Any], payload: Optional[bytes] = None) -> bytes:
+    """Encode an insight as a single SSE message frame.
+
+    `event_id` comes from the client, so it only becomes the `id:` line when it
+    cannot break out of that line; otherwise the line is omitted.
+    """
+    if payload is None:
+        payload = encode_payload(insight)
+    event_id = insight.get("event_id")
+    if event_id:
+        event_id = str(event_id)
+        if not any(c in event_id for c in _SSE_LINE_BREAKS):
+            return f"id: {event_id}\ndata: ".encode("utf-8") + payload + b"\n\n"
+    return b"data: " + payload + b"\n\n"
+
+
+def parse_risk_filter(raw: Optional[str]) -> Optional[Set[str]]:
+    """Parse a comma-separated `risk` query value; None means no filtering."""
+    if not raw:
+        return None
+    risks = {r.strip().upper() for r in raw.split(",") if r.strip()}
+    unknown = risks - set(RISK_LEVELS)
+    if unknown:
+        raise ValueError(f"Unknown risk level(s): {', '.join(sorted(unknown))}")
+    return risks or None
+
+
+class Subscriber:
+    """One connected dashboard: a bounded ring buffer of pre-encoded frames."""
+
+    __slots__ = ("risks", "binary", "buffer", "dropped", "ready")
+
+    def __init__(self, buffer_size: int, risks: Optional[Set[str]] = None, binary: bool = False):
+        self.risks = risks
+        self.binary = binary
+        self.buffer: Deque[bytes] = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.ready = threading.Event()
+
+    def wants(self, risk: Optional[str]) -> bool:
+        return self.risks is None or risk in self.risks
+
+
+class InsightBroadcaster:
+    """Fan out scored insights to SSE subscribers.
+
+    Slow clients never block publishers: when a subscriber's buffer is full
+    the oldest frame is dropped and the loss is reported to that client as a
+    `dropped` event the next time it drains. Binary subscribers receive
+    length-prefixed JSON frames instead of SSE text.
+    """
+
+    def __init__(self, buffer_size: int = 256, heartbeat_seconds: float = 15.0):
+        self.buffer_size = buffer_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self._lock = threading.Lock()
+        self._subscribers: Set[Subscriber] = set()
+        self.published = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, risks: Optional[Set[str]] = None, binary: bool = False) -> Subscriber:
+        sub = Subscriber(self.buffer_size, risks, binary)
+        with self._lock:
+            self._subscribers.add(sub)
+        logger.info(f"SSE client subscribed ({self.subscriber_count} connected)")
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(sub)
+        logger.info(f"SSE client unsubscribed ({self.subscriber_count} connected)")
+
+    def publish(self, insight: Dict[str, Any]) -> int:
+        """Queue an insight for every matching subscriber; returns the fan-out count."""
+        if not self._subscribers:
+            return 0
+        payload = encode_payload(insight)
+        frames: Dict[bool, bytes] = {}
+        risk = insight.get("risk")
+        delivered = 0
+        with self._lock:
+            self.published += 1
+            for sub in self._subscribers:
+                if not sub.wants(risk):
+                    continue
+                frame = frames.get(sub.binary)
+                if frame is None:
+                    frame = encode_frame(payload) if sub.binary else encode_sse(insight, payload)
+                    frames[sub.binary] = frame
+                if len(sub.buffer) == sub.buffer.maxlen:
+                    sub.dropped += 1
+                sub.buffer.append(frame)
+                sub.ready.set()
+                delivered += 1
+        return delivered
+
+    def _drain(self, sub: Subscriber) -> Iterable[bytes]:
+        with self._lock:
+            frames = list(sub.buffer)
+            sub.buffer.clear()
+            dropped, sub.dropped = sub.dropped, 0
+        if dropped:
+            notice = f"{{\"dropped\":{dropped}}}".encode("utf-8")
+            if sub.binary:
+                frames.insert(0, encode_frame(notice))
+            else:
+                frames.insert(0, b"event: dropped\ndata: " + notice + b"\n\n")
+        return frames
+
+    def stream(self, risks: Optional[Set[str]] = None, binary: bool = False) -> Iterator[bytes]:
+        """Subscribe and yield frames until the client disconnects."""
+        sub = self.subscribe(risks, binary)
+        heartbeat = BINARY_HEARTBEAT_FRAME if binary else HEARTBEAT_FRAME
+        try:
+            if not binary:
+                yield b"retry: 3000\n\n"
+            while True:
+                if not sub.ready.wait(timeout=self.heartbeat_seconds):
+                    yield heartbeat
+                    continue
+                sub.ready.clear()
+                for frame in self._drain(sub):
+                    yield frame
+        finally:
+            self.unsubscribe(sub)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Differential replay harness for fraud scoring pipelines
+Replays a recorded event corpus through two pipelines in deterministic mode
+and reports per-event score/label divergence plus throughput for each.
+
+    python3 replay_fraud_detection.py --corpus events.jsonl reference record
+    python3 replay_fraud_detection.py --generate 5000 --save events.jsonl reference batch
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+import fraud_detection_service as service
+from fast_codec import TransactionRecord
+
+Pipeline = Callable[[List[Dict[str, Any]], argparse.Namespace], List[Dict[str, Any]]]
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Pipelines: each scores the whole corpus in order and returns one result per event
+
+
+def _reset_rule_state() -> None:
+    service._recent_by_card_tail.clear()
+
+
+def run_reference(events: List[Dict[str, Any]], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """`analyze_transaction` on the full event dicts."""
+    _reset_rule_state()
+    return [service.analyze_transaction(dict(event)) for event in events]
+
+
+def run_record(events: List[Dict[str, Any]], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """`analyze_transaction` on compact `TransactionRecord`s (the /analyze fast path)."""
+    _reset_rule_state()
+    return [service.analyze_transaction(TransactionRecord.from_dict(event)) for event in events]
+
+
+def run_batch(events: List[Dict[str, Any]], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """The /analyze/batch handler via the Flask test client, framed encoding."""
+    import fast_codec
+    _reset_rule_state()
+    client = service.app.test_client()
+    results = []
+    for i in range(0, len(events), args.batch_size):
+        chunk = events[i:i + args.batch_size]
+        body = fast_codec.encode_frames([json.dumps(e).encode("utf-8") for e in chunk])
+        response = client.post("/analyze/batch", data=body, content_type=fast_codec.FRAME_MIMETYPE)
+        results.extend(fast_codec.loads(frame) for frame in fast_codec.iter_frames(response.data))
+    return results
+
+
+def run_http(events: List[Dict[str, Any]], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """A running service at --url (start it with SCORING_DETERMINISTIC=true and fresh state)."""
+    import requests
+    session = requests.Session()
+    return [session.post(f"{args.url}/analyze", json=event, timeout=10).json() for event in events]
+
+
+PIPELINES: Dict[str, Pipeline] = {
+    "reference": run_reference,
+    "record": run_record,
+    "batch": run_batch,
+    "http": run_http
+}
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Corpus
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    """Read one JSON event per line."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def generate_corpus(count: int, seed: int) -> List[Dict[str, Any]]:
+    """Synthetic events shaped like the backend's mock transactions."""
+    rng = random.Random(seed)
+    merchants = [("Shell Gas", "Gas"), ("Whole Foods", "Groceries"), ("Nike", "Clothing"),
+                 ("Best Buy", "Electronics"), ("Starbucks", "Dining"), ("Online Store", "Shopping")]
+    cities = ["Los Angeles", "Phoenix", "San Diego", "Chicago", "Dallas", "New York", "Philadelphia", "Houston"]
+    states = ["CA", "TX", "FL", "NY", "PA", "IL", "OH", "AZ"]
+    ts = datetime(2025, 1, 15)
+    events = []
+    for i in range(count):
+        ts += timedelta(milliseconds=rng.randint(0, 1500))
+        merchant, category = rng.choice(merchants)
+        events.append({
+            "event_id": f"evt_replay_{i:07d}",
+            "ts": ts.isoformat(timespec="milliseconds") + "Z",
+            "card_number": f"****-****-****-{rng.randint(1000, 1040)}",
+            "merchant_name": merchant,
+            "category": category if rng.random() > 0.1 else rng.choice(merchants)[1],
+            "amount": round(rng.uniform(1, 1500), 2),
+            "currency": "USD",
+            "city": rng.choice(cities),
+            "state": rng.choice(states),
+            "zip": str(rng.randint(10000, 99999)),
+            "status": "approved"
+        })
+    return events
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Diffing
+
+
+def diff_results(events: List[Dict[str, Any]], left: List[Dict[str, Any]], right: List[Dict[str, Any]],
+                 tolerance: float) -> List[Dict[str, Any]]:
+    """Per-event differences in risk label, score or flags."""
+    divergences = []
+    for event, a, b in zip(events, left, right):
+        fields = []
+        if a.get("risk") != b.get("risk"):
+            fields.append("risk")
+        if abs(float(a.get("score", 0)) - float(b.get("score", 0))) > tolerance:
+            fields.append("score")
+        if a.get("flags") != b.get("flags"):
+            fields.append("flags")
+        if fields:
+            divergences.append({"event_id": event.get("event_id"), "fields": fields, "left": a, "right": b})
+    if len(left) != len(right):
+        divergences.append({"event_id": None, "fields": ["count"], "left": len(left), "right": len(right)})
+    return divergences
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Differential replay of fraud scoring pipelines")
+    parser.add_argument("left", choices=sorted(PIPELINES), help="Baseline pipeline")
+    parser.add_argument("right", choices=sorted(PIPELINES), help="Pipeline under test")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--corpus", "-c", help="JSONL file of recorded events")
+    source.add_argument("--generate", "-g", type=int, help="Generate this many synthetic events")
+    parser.add_argument("--save", help="Write the generated corpus to this JSONL file")
+    parser.add_argument("--seed", type=int, default=7, help="Corpus generator seed")
+    parser.add_argument("--scoring-seed", default="", help="Seed mixed into per-event scoring noise")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Allowed absolute score difference")
+    parser.add_argument("--batch-size", type=int, default=100, help="Events per request for the batch pipeline")
+    parser.add_argument("--url", default="http://localhost:5001", help="Service URL for the http pipeline")
+    parser.add_argument("--show", type=int, default=10, help="Divergences to print")
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        events = load_corpus(args.corpus)
+    else:
+        events = generate_corpus(args.generate, args.seed)
+        if args.save:
+            with open(args.save, "w") as f:
+                f.writelines(json.dumps(e) + "\n" for e in events)
+
+    service.DETERMINISTIC_SCORING = True
+    service.SCORING_SEED = args.scoring_seed
+
+    outputs = {}
+    print(f"Replaying {len(events)} events")
+    for side in ("left", "right"):
+        name = getattr(args, side)
+        start = time.perf_counter()
+        outputs[side] = PIPELINES[name](events, args)
+        elapsed = time.perf_counter() - start
+        rate = len(events) / elapsed if elapsed else float("inf")
+        print(f"  {side:<5} {name:<10} {rate:>12,.0f} events/s  ({elapsed:.3f}s)")
+
+    divergences = diff_results(events, outputs["left"], outputs["right"], args.tolerance)
+    print(f"\n{len(divergences)} divergent event(s)")
+    for d in divergences[:args.show]:
+        print(f"  {d['event_id']}: {', '.join(d['fields'])}")
+        print(f"    left:  {json.dumps(d['left'], sort_keys=True)}")
+        print(f"    right: {json.dumps(d['right'], sort_keys=True)}")
+    return 1 if divergences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Crash-safe persistence for velocity rule state
+Append-only write-ahead log plus periodic memory-mapped snapshots
+"""
+
+import fcntl
+import glob
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# WAL record: crc32 | ts (int64 ms) | key length | key bytes
+_WAL_CRC = struct.Struct(">I")
+_WAL_BODY = struct.Struct(">qB")
+_WAL_HEADER_SIZE = _WAL_CRC.size + _WAL_BODY.size
+# Snapshot: magic | covered WAL generation | written-at wall clock ms | entry count | body crc32
+_SNAP_MAGIC = b"VELSNAP1"
+_SNAP_HEADER = struct.Struct(">8sQqII")
+_SNAP_ENTRY = struct.Struct(">BH")
+_TS = struct.Struct(">q")
+
+
+def record_velocity(state: Dict[str, List[int]], key: str, t: int, window_ms: int) -> List[int]:
+    """Append `t` to a card's sliding window, evicting entries older than `window_ms`."""
+    lst = state.setdefault(key, [])
+    while lst and (t - lst[0]) > window_ms:
+        lst.pop(0)
+    lst.append(t)
+    return lst
+
+
+class VelocityStateStore:
+    """Durable backing for the per-card velocity windows.
+
+    `observe` updates the in-memory window and appends to the current WAL
+    generation under one lock, and snapshots copy the state and switch to a
+    new generation under that same lock. Every observation is therefore either
+    in the snapshot or in a WAL generation newer than it, never both. A
+    background thread writes the snapshots so request threads only pay for
+    the WAL append; with the "interval" policy it also syncs a WAL tail left
+    behind when traffic stops, so no write stays unsynced much longer than
+    `fsync_interval_ms`.
+    """
+
+    def __init__(self, directory: str, window_ms: int, fsync: str = "interval",
+                 fsync_interval_ms: int = 200, snapshot_interval_s: float = 30.0,
+                 max_wal_bytes: int = 16 * 1024 * 1024, retention_ms: int = 300000):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync policy must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.directory = directory
+        self.window_ms = window_ms
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval_ms / 1000.0
+        self.snapshot_interval = snapshot_interval_s
+        self.max_wal_bytes = max_wal_bytes
+        self.retention_ms = retention_ms
+
+        self.state: Dict[str, List[int]] = {}
+        # Wall-clock ms each card was last observed; retention uses this, never event `ts`
+        self._last_seen: Dict[str, int] = {}
+        self.stats: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closing = False
+        self._snapshotter: Optional[threading.Thread] = None
+        self._generation = 0
+        self._wal_fd: Optional[int] = None
+        self._wal_bytes = 0
+        self._unsynced = False
+        self._last_fsync = time.monotonic()
+        self._last_snapshot = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+
+        # Only one process may own the log; a second writer would interleave generations
+        self._lock_fd = os.open(os.path.join(directory, "velocity.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(self._lock_fd)
+            raise RuntimeError(f"Velocity state in {directory} is locked by another process")
+
+    # ── paths ─────────────────────────────────────────────────────────────────
+
+    @property
+    def snapshot_path(self) -> str:
+        return os.path.join(self.directory, "velocity.snapshot")
+
+    def _wal_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"velocity-{generation:010d}.wal")
+
+    def _wal_generations(self) -> List[int]:
+        pattern = os.path.join(self.directory, "velocity-*.wal")
+        return sorted(int(os.path.basename(p)[9:-4]) for p in glob.glob(pattern))
+
+    def _fsync_dir(self) -> None:
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # ── recovery ──────────────────────────────────────────────────────────────
+
+    def recover(self) -> Dict[str, List[int]]:
+        """Load the last snapshot, replay newer WAL generations and open a fresh WAL."""
+        start = time.perf_counter()
+        covered = self._load_snapshot()
+        snapshot_cards = len(self.state)
+
+        replayed = 0
+        generations = self._wal_generations()
+        for generation in generations:
+            if generation <= covered:
+                os.remove(self._wal_path(generation))
+                continue
+            replayed += self._replay_wal(generation)
+
+        # Recovered cards get a full retention period from restart
+        now_ms = int(time.time() * 1000)
+        self._last_seen = dict.fromkeys(self.state, now_ms)
+
+        self._generation = max([covered] + generations)
+        self._retire_wal(self._open_wal(self._generation + 1))
+        if replayed:
+            self.snapshot()
+
+        self._snapshotter = threading.Thread(target=self._snapshot_loop, name="velocity-snapshot", daemon=True)
+        self._snapshotter.start()
+
+        self.stats = {
+            "recovery_ms": round((time.perf_counter() - start) * 1000, 2),
+            "snapshot_cards": snapshot_cards,
+            "wal_records_replayed": replayed,
+            "cards": len(self.state)
+        }
+        logger.info(f"Recovered velocity state: {self.stats}")
+        return self.state
+
+    def _load_snapshot(self) -> int:
+        if not os.path.exists(self.snapshot_path) or os.path.getsize(self.snapshot_path) < _SNAP_HEADER.size:
+            return 0
+        with open(self.snapshot_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, covered, _written_at, count, crc = _SNAP_HEADER.unpack_from(mm, 0)
+            if magic != _SNAP_MAGIC or zlib.crc32(mm[_SNAP_HEADER.size:]) != crc:
+                logger.error("Velocity snapshot is corrupt; replaying WAL only")
+                return 0
+            offset = _SNAP_HEADER.size
+            for _ in range(count):
+                key_len, n = _SNAP_ENTRY.unpack_from(mm, offset)
+                offset += _SNAP_ENTRY.size
+                key = mm[offset:offset + key_len].decode("utf-8")
+                offset += key_len
+                self.state[key] = list(struct.unpack_from(f">{n}q", mm, offset))
+                offset += n * _TS.size
+        return covered
+
+    def _replay_wal(self, generation: int) -> int:
+        path = self._wal_path(generation)
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = replayed = 0
+        while offset + _WAL_HEADER_SIZE <= len(data):
+            (crc,) = _WAL_CRC.unpack_from(data, offset)
+            t, key_len = _WAL_BODY.unpack_from(data, offset + _WAL_CRC.size)
+            end = offset + _WAL_HEADER_SIZE + key_len
+            if end > len(data) or zlib.crc32(data[offset + _WAL_CRC.size:end]) != crc:
+                break
+            key = data[offset + _WAL_HEADER_SIZE:end].decode("utf-8")
+            record_velocity(self.state, key, t, self.window_ms)
+            offset = end
+            replayed += 1
+        if offset != len(data):
+            logger.warning(f"Discarding {len(data) - offset} torn bytes at end of {path}")
+            os.truncate(path, offset)
+        return replayed
+
+    # ── write path ────────────────────────────────────────────────────────────
+
+    def _open_wal(self, generation: int) -> Optional[int]:
+        """Switch appends to a new generation; returns the previous fd for `_retire_wal`."""
+        old_fd = self._wal_fd
+        self._wal_fd = os.open(self._wal_path(generation), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._generation = generation
+        self._wal_bytes = 0
+        self._unsynced = False  # `_retire_wal` syncs the old generation
+        return old_fd
+
+    def _retire_wal(self, fd: Optional[int]) -> None:
+        if fd is not None:
+            os.fsync(fd)
+            os.close(fd)
+        self._fsync_dir()
+
+    def observe(self, key: str, t: int) -> List[int]:
+        """Record one velocity observation in `state` and the WAL; returns the card's window."""
+        key_bytes = key.encode("utf-8")[:255]
+        body = _WAL_BODY.pack(t, len(key_bytes)) + key_bytes
+        record = _WAL_CRC.pack(zlib.crc32(body)) + body
+        seen_ms = int(time.time() * 1000)
+        with self._lock:
+            lst = record_velocity(self.state, key, t, self.window_ms)
+            self._last_seen[key] = seen_ms
+            if self._wal_fd is None:
+                return lst
+            os.write(self._wal_fd, record)
+            self._wal_bytes += len(record)
+            now = time.monotonic()
+            if self.fsync == "always" or (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval):
+                os.fsync(self._wal_fd)
+                self._last_fsync = now
+                self._unsynced = False
+            else:
+                self._unsynced = True
+            if self._wal_bytes >= self.max_wal_bytes:
+                self._wake.set()
+        return lst
+
+    # ── snapshots ─────────────────────────────────────────────────────────────
+
+    def _sync_idle_wal(self) -> None:
+        """fsync a WAL tail left unsynced because traffic stopped inside an interval."""
+        with self._lock:
+            now = time.monotonic()
+            if self._unsynced and self._wal_fd is not None and now - self._last_fsync >= self.fsync_interval:
+                os.fsync(self._wal_fd)
+                self._last_fsync = now
+                self._unsynced = False
+
+    def _snapshot_loop(self) -> None:
+        poll = min(self.snapshot_interval, 1.0)
+        if self.fsync == "interval":
+            poll = min(poll, self.fsync_interval)
+        while True:
+            self._wake.wait(timeout=poll)
+            self._wake.clear()
+            if self._closing:
+                return
+            if self.fsync == "interval":
+                try:
+                    self._sync_idle_wal()
+                except OSError as e:
+                    logger.error(f"Velocity WAL fsync failed: {e}")
+            if time.monotonic() - self._last_snapshot >= self.snapshot_interval or self._wal_bytes >= self.max_wal_bytes:
+                try:
+                    self.snapshot()
+                except Exception as e:
+                    logger.error(f"Velocity snapshot failed: {e}")
+
+    def snapshot(self) -> None:
+        """Write live state to a memory-mapped snapshot and drop covered WAL files.
+
+        Cards not observed for `retention_ms` of wall-clock time are left out
+        of the snapshot (but not removed from the live state). Retention never
+        looks at event timestamps, so future-dated, backfilled or
+        timezone-shifted `ts` values cannot evict cards.
+        """
+        with self._snapshot_lock:
+            self._snapshot()
+
+    def _snapshot(self) -> None:
+        written_at = int(time.time() * 1000)
+        cutoff = written_at - self.retention_ms
+        with self._lock:
+            covered = self._generation
+            old_fd = self._open_wal(covered + 1)
+            self._last_snapshot = time.monotonic()
+            last_seen = self._last_seen
+            entries = [(k.encode("utf-8")[:255], v[-0xFFFF:]) for k, v in self.state.items()
+                       if v and last_seen.get(k, 0) >= cutoff]
+        self._retire_wal(old_fd)
+
+        size = _SNAP_HEADER.size + sum(_SNAP_ENTRY.size + len(k) + len(v) * _TS.size for k, v in entries)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w+b") as f:
+            f.truncate(size)
+            with mmap.mmap(f.fileno(), size) as mm:
+                offset = _SNAP_HEADER.size
+                for key, stamps in entries:
+                    _SNAP_ENTRY.pack_into(mm, offset, len(key), len(stamps))
+                    offset += _SNAP_ENTRY.size
+                    mm[offset:offset + len(key)] = key
+                    offset += len(key)
+                    struct.pack_into(f">{len(stamps)}q", mm, offset, *stamps)
+                    offset += len(stamps) * _TS.size
+                crc = zlib.crc32(mm[_SNAP_HEADER.size:])
+                _SNAP_HEADER.pack_into(mm, 0, _SNAP_MAGIC, covered, written_at, len(entries), crc)
+                mm.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        self._fsync_dir()
+
+        for generation in self._wal_generations():
+            if generation <= covered:
+                os.remove(self._wal_path(generation))
+
+    def close(self, snapshot: bool = True) -> None:
+        """Close the WAL, taking a final snapshot unless `snapshot` is False."""
+        if self._wal_fd is None:
+            return
+        self._closing = True
+        self._wake.set()
+        if self._snapshotter is not None:
+            self._snapshotter.join()
+        if snapshot:
+            self.snapshot()
+        with self._lock:
+            os.fsync(self._wal_fd)
+            os.close(self._wal_fd)
+            self._wal_fd = None
+        os.close(self._lock_fd)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Tests for the fast scoring codec and framing
+"""
+
+import json
+
+import pytest
+
+import fast_codec
+from fast_codec import TransactionRecord
+
+
+def test_record_get_matches_dict_get():
+    event = {"amount": None, "city": None, "merchant_name": "Shell Gas"}
+    record = TransactionRecord.from_dict(event)
+    for key in TransactionRecord.FIELDS:
+        assert record.get(key, "default") == event.get(key, "default"), key
+    assert record.get("amount", 0) is None
+    assert record.get("zip", "") == ""
+
+
+def test_encode_result_matches_sorted_compact_json():
+    result = {
+        "risk": "REVIEW",
+        "score": 0.41,
+        "explanation": 'Unusual "quoted" time',
+        "flags": {"mismatch": True, "expected": None, "geo_invalid": False,
+                  "amount_high": False, "velocity_burst": True, "high_amount": False}
+    }
+    expected = json.dumps(result, separators=(",", ":"), sort_keys=True) + "\n"
+    assert fast_codec.encode_result(result) == expected.encode("utf-8")
+
+
+def test_frames_round_trip_and_truncation():
+    buf = fast_codec.encode_frames([b'{"a":1}\n', b"[]"])
+    assert [fast_codec.loads(frame) for frame in fast_codec.iter_frames(buf)] == [{"a": 1}, []]
+    with pytest.raises(ValueError):
+        list(fast_codec.iter_frames(buf[:-1]))
+
+
+def test_iter_messages_skips_heartbeat_frames():
+    from insight_broadcaster import BINARY_HEARTBEAT_FRAME
+
+    buf = BINARY_HEARTBEAT_FRAME + fast_codec.encode_frame(b'{"a":1}') + BINARY_HEARTBEAT_FRAME
+    assert list(fast_codec.iter_messages(buf)) == [{"a": 1}]
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+In-process tests for the fraud detection service
+"""
+
+import json
+
+import pytest
+
+import fast_codec
+import fraud_detection_service as service
+
+EVENT = {
+    "event_id": "evt_test_001",
+    "ts": "2025-01-15T14:54:34.967Z",
+    "card_number": "****-****-****-3565",
+    "merchant_name": "Shell Gas",
+    "category": "Gas",
+    "amount": 361.23,
+    "city": "Los Angeles",
+    "state": "PA",
+    "zip": "54280"
+}
+
+
+@pytest.fixture
+def deterministic(monkeypatch):
+    monkeypatch.setattr(service, "DETERMINISTIC_SCORING", True)
+    monkeypatch.setattr(service, "SCORING_SEED", "")
+    monkeypatch.setattr(service, "state_store", None)
+    monkeypatch.setattr(service, "_recent_by_card_tail", {})
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Deterministic scoring
+
+
+def test_same_event_gets_same_llm_score(deterministic):
+    scores = {service.llm_refine_enhanced(dict(EVENT), {})["llm_score"] for _ in range(20)}
+    assert len(scores) == 1
+
+
+def test_scoring_seed_changes_scores(deterministic, monkeypatch):
+    events = [dict(EVENT, event_id=f"evt_{i}", amount=5000) for i in range(20)]
+
+    def scores():
+        return [service.llm_refine_enhanced(e, {})["llm_score"] for e in events]
+
+    unseeded = scores()
+    monkeypatch.setattr(service, "SCORING_SEED", "other-seed")
+    assert scores() != unseeded
+    assert service._event_noise(EVENT) != service._event_noise(dict(EVENT, event_id="evt_other"))
+
+
+def test_noise_stays_in_range(deterministic):
+    noise = [service._event_noise(dict(EVENT, event_id=f"evt_{i}")) for i in range(2000)]
+    assert all(-0.1 <= n <= 0.1 for n in noise)
+    assert min(noise) < -0.09 and max(noise) > 0.09
+
+
+def test_events_without_id_hash_on_fallback_fields(deterministic):
+    event = {k: v for k, v in EVENT.items() if k != "event_id"}
+    # Fields outside ts/card/merchant/amount do not change the identity
+    assert service._event_hash(event) == service._event_hash(dict(event, city="Phoenix", zip="85001"))
+    for field, value in (("ts", "2025-01-15T14:54:35.000Z"), ("card_number", "****-****-****-0000"),
+                         ("merchant_name", "Nike"), ("amount", 361.24)):
+        assert service._event_hash(event) != service._event_hash(dict(event, **{field: value}))
+
+
+def test_missing_ts_uses_hash_pseudo_time(deterministic, monkeypatch):
+    def wall_clock():
+        raise AssertionError("deterministic mode read the wall clock")
+
+    monkeypatch.setattr(service, "_now_ms", wall_clock)
+    event = {k: v for k, v in EVENT.items() if k != "ts"}
+    service.classify_rules(event)
+    assert service._recent_by_card_tail["3565"] == [service._event_hash(event) % 2**40]
+
+
+# ────────────────────────────────────────────────────────────────────────────────
+# Endpoints
+
+
+@pytest.fixture
+def client(deterministic):
+    return service.app.test_client()
+
+
+def _batch(count):
+    return [dict(EVENT, event_id=f"evt_batch_{i}", amount=100 + i * 300) for i in range(count)]
+
+
+def _reference(events):
+    service._recent_by_card_tail.clear()
+    return [service.analyze_transaction(dict(e)) for e in events]
+
+
+def test_malformed_json_is_rejected(client):
+    for path in ("/analyze", "/analyze/batch"):
+        response = client.post(path, data=b'{"amount": ', content_type="application/json")
+        assert response.status_code == 400, path
+        assert "error" in response.get_json()
+
+
+def test_truncated_frame_is_rejected(client):
+    body = fast_codec.encode_frames([json.dumps(EVENT).encode("utf-8")])[:-3]
+    response = client.post("/analyze/batch", data=body, content_type=fast_codec.FRAME_MIMETYPE)
+    assert response.status_code == 400
+    assert "Truncated" in response.get_json()["error"]
+
+
+def test_non_object_batch_item_is_rejected(client):
+    response = client.post("/analyze/batch", json=[EVENT, 42])
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Every batch item must be a transaction object"
+
+
+def test_json_array_batch_round_trip(client):
+    events = _batch(5)
+    response = client.post("/analyze/batch", json=events)
+    assert response.status_code == 200
+    assert response.get_json() == _reference(events)
+
+
+def test_framed_batch_round_trip(client):
+    events = _batch(5)
+    body = fast_codec.encode_frames([json.dumps(e).encode("utf-8") for e in events])
+    response = client.post("/analyze/batch", data=body, content_type=fast_codec.FRAME_MIMETYPE)
+    assert response.status_code == 200
+    assert response.mimetype == fast_codec.FRAME_MIMETYPE
+    assert list(fast_codec.iter_messages(response.data)) == _reference(events)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Tests for the zip/city geo validation index
+"""
+
+from geo_index import GeoIndex
+
+# Real places missing from the bundled seed city table
+UNLISTED_NAMESAKES = [
+    ("Springfield", "VA"), ("Washington", "PA"), ("Columbus", "MS"), ("Jacksonville", "NC"),
+    ("Athens", "OH"), ("Richmond", "KY"), ("Portland", "TX"), ("Arlington", "MA")
+]
+
+
+def test_seed_city_table_does_not_flag_namesakes():
+    index = GeoIndex.load()
+    for city, state in UNLISTED_NAMESAKES:
+        assert not index.is_mismatch(city, state), (city, state)
+
+
+def test_zip_outside_state_is_flagged():
+    index = GeoIndex.load()
+    assert index.is_mismatch("Portland", "ME", "97201")
+    assert index.is_mismatch("Anywhere", "TX", "10001-1234")
+    assert not index.is_mismatch("Portland", "ME", "04101")
+    assert not index.is_mismatch("San Francisco", "CA", 94102)
+
+
+def test_complete_city_table_enables_city_checks():
+    index = GeoIndex.load(cities_complete=True)
+    assert index.is_mismatch("Los Angeles", "PA")
+    assert not index.is_mismatch("St. Louis", "MO")
+    assert index.city_states("kansas  city") == {"KS", "MO"}
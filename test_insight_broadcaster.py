@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the SSE insight broadcaster
+"""
+
+import fast_codec
+from insight_broadcaster import BINARY_HEARTBEAT_FRAME, HEARTBEAT_FRAME, InsightBroadcaster, encode_sse
+
+
+def test_event_id_cannot_inject_sse_lines():
+    forged = 'x\ndata: {"risk":"LIKELY_FRAUD"}\n\nid: y'
+    for event_id in (forged, "a\rb", "a\0b"):
+        frame = encode_sse({"event_id": event_id, "risk": "OK"})
+        assert not frame.startswith(b"id:")
+        # Exactly one message, whose only field is the JSON-escaped data line
+        assert frame.count(b"\n\n") == 1 and frame.endswith(b"\n\n")
+        assert frame.count(b"\n") == 2 and frame.startswith(b"data: ")
+
+
+def test_plain_event_id_is_kept():
+    assert encode_sse({"event_id": "evt_1", "risk": "OK"}).startswith(b"id: evt_1\ndata: ")
+
+
+def _started(broadcaster, **kwargs):
+    stream = broadcaster.stream(**kwargs)
+    first = next(stream)  # subscribes and yields the preamble or a heartbeat
+    return stream, first
+
+
+def test_slow_client_drops_oldest_and_is_notified():
+    broadcaster = InsightBroadcaster(buffer_size=2, heartbeat_seconds=0.1)
+    stream, first = _started(broadcaster)
+    assert first == b"retry: 3000\n\n"
+    for i in range(5):
+        broadcaster.publish({"event_id": f"e{i}", "risk": "REVIEW"})
+    assert next(stream) == b'event: dropped\ndata: {"dropped":3}\n\n'
+    assert next(stream).startswith(b"id: e3\n")
+    assert next(stream).startswith(b"id: e4\n")
+    stream.close()
+
+
+def test_risk_filter_and_heartbeat():
+    broadcaster = InsightBroadcaster(buffer_size=2, heartbeat_seconds=0.1)
+    stream, _ = _started(broadcaster, risks={"LIKELY_FRAUD"})
+    assert broadcaster.publish({"event_id": "ok", "risk": "OK"}) == 0
+    assert next(stream) == HEARTBEAT_FRAME
+    assert broadcaster.publish({"event_id": "bad", "risk": "LIKELY_FRAUD"}) == 1
+    assert next(stream).startswith(b"id: bad\n")
+    stream.close()
+
+
+def test_binary_stream_uses_frames():
+    broadcaster = InsightBroadcaster(buffer_size=2, heartbeat_seconds=0.1)
+    stream, first = _started(broadcaster, binary=True)
+    assert first == BINARY_HEARTBEAT_FRAME
+    broadcaster.publish({"event_id": "e1", "risk": "OK"})
+    frames = list(fast_codec.iter_frames(next(stream)))
+    assert fast_codec.loads(frames[0]) == {"event_id": "e1", "risk": "OK"}
+    stream.close()
+
+
+def test_closing_stream_unsubscribes():
+    broadcaster = InsightBroadcaster(buffer_size=2, heartbeat_seconds=0.1)
+    stream, _ = _started(broadcaster)
+    assert broadcaster.subscriber_count == 1
+    stream.close()
+    assert broadcaster.subscriber_count == 0
+    assert broadcaster.publish({"event_id": "e1", "risk": "OK"}) == 0
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for the differential replay harness
+"""
+
+import replay_fraud_detection as replay
+from replay_fraud_detection import diff_results
+
+EVENTS = [{"event_id": "evt_1"}, {"event_id": "evt_2"}]
+RESULT = {"risk": "REVIEW", "score": 0.4, "flags": {"velocity_burst": False}}
+
+
+def test_diff_results_reports_each_kind_of_divergence():
+    right = [
+        dict(RESULT, risk="OK", score=0.45),
+        dict(RESULT, flags={"velocity_burst": True})
+    ]
+    divergences = diff_results(EVENTS, [RESULT, RESULT], right, tolerance=0.0)
+    assert [(d["event_id"], d["fields"]) for d in divergences] == [
+        ("evt_1", ["risk", "score"]),
+        ("evt_2", ["flags"])
+    ]
+
+
+def test_diff_results_respects_tolerance():
+    assert diff_results(EVENTS[:1], [RESULT], [dict(RESULT, score=0.41)], tolerance=0.02) == []
+    assert diff_results(EVENTS[:1], [RESULT], [dict(RESULT, score=0.43)], tolerance=0.02)[0]["fields"] == ["score"]
+
+
+def test_diff_results_reports_count_mismatch():
+    divergences = diff_results(EVENTS, [RESULT, RESULT], [RESULT], tolerance=0.0)
+    assert divergences == [{"event_id": None, "fields": ["count"], "left": 2, "right": 1}]
+
+
+def test_main_exit_status(monkeypatch):
+    monkeypatch.setattr(replay.service, "DETERMINISTIC_SCORING", False)
+    monkeypatch.setattr(replay.service, "SCORING_SEED", "")
+    assert replay.main(["reference", "record", "--generate", "50"]) == 0
+
+    def skewed(events, args):
+        return [dict(r, score=r["score"] + 0.05) for r in replay.run_reference(events, args)]
+
+    monkeypatch.setitem(replay.PIPELINES, "skewed", skewed)
+    assert replay.main(["reference", "skewed", "--generate", "50"]) == 1
+    assert replay.main(["reference", "skewed", "--generate", "50", "--tolerance", "0.1"]) == 0
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Recovery tests for the durable velocity state store
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from rule_state_store import VelocityStateStore
+
+WINDOW_MS = 2000
+
+
+def _open(directory, **kwargs) -> VelocityStateStore:
+    store = VelocityStateStore(str(directory), WINDOW_MS, fsync="never", snapshot_interval_s=3600, **kwargs)
+    store.recover()
+    return store
+
+
+def _wal_files(directory):
+    return sorted(f for f in os.listdir(directory) if f.endswith(".wal"))
+
+
+def test_truncated_wal_is_recovered(tmp_path):
+    store = _open(tmp_path)
+    now = int(time.time() * 1000)
+    for key, t in [("1111", now), ("1111", now + 500), ("2222", now + 600)]:
+        store.observe(key, t)
+    store.close(snapshot=False)
+
+    # Simulate a crash mid-write: a partial record at the end of the log
+    with open(os.path.join(tmp_path, _wal_files(tmp_path)[-1]), "ab") as f:
+        f.write(b"\x00\x01\x02")
+
+    recovered = _open(tmp_path)
+    assert recovered.state == {"1111": [now, now + 500], "2222": [now + 600]}
+    assert recovered.stats["wal_records_replayed"] == 3
+    recovered.close()
+
+
+def test_corrupt_snapshot_falls_back_to_wal(tmp_path):
+    store = _open(tmp_path)
+    now = int(time.time() * 1000)
+    store.observe("1111", now)
+    store.snapshot()
+    store.observe("2222", now + 100)
+    store.close(snapshot=False)
+
+    with open(store.snapshot_path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"\xff")
+
+    recovered = _open(tmp_path)
+    # The snapshot is rejected; only observations still in the WAL come back
+    assert recovered.state == {"2222": [now + 100]}
+    recovered.close()
+
+
+def test_observation_is_replayed_once_across_snapshot(tmp_path):
+    store = _open(tmp_path)
+    now = int(time.time() * 1000)
+    store.observe("1111", now)
+    store.snapshot()
+    store.observe("1111", now + 100)
+    store.close(snapshot=False)
+
+    recovered = _open(tmp_path)
+    assert recovered.state == {"1111": [now, now + 100]}
+    recovered.close()
+
+
+def test_future_timestamp_does_not_evict_other_cards(tmp_path):
+    store = _open(tmp_path)
+    now = int(time.time() * 1000)
+    for key in ("1111", "2222", "3333"):
+        store.observe(key, now)
+    store.observe("9999", 4102444800000)  # 2100-01-01
+    store.snapshot()
+    assert set(store.state) == {"1111", "2222", "3333", "9999"}
+    store.close(snapshot=False)
+
+    recovered = _open(tmp_path)
+    assert set(recovered.state) == {"1111", "2222", "3333", "9999"}
+    recovered.close()
+
+
+def test_idle_cards_are_left_out_of_snapshot_only(tmp_path, monkeypatch):
+    store = _open(tmp_path, retention_ms=60000)
+    now = int(time.time() * 1000)
+    store.observe("1111", now)
+    with monkeypatch.context() as m:
+        # Last observed two minutes ago by the wall clock
+        m.setattr(time, "time", lambda: (now - 120000) / 1000)
+        store.observe("2222", now)
+    store.snapshot()
+    assert set(store.state) == {"1111", "2222"}
+    store.close(snapshot=False)
+
+    recovered = _open(tmp_path)
+    assert set(recovered.state) == {"1111"}
+    recovered.close()
+
+
+def test_interval_fsync_syncs_tail_when_traffic_stops(tmp_path):
+    store = VelocityStateStore(str(tmp_path), WINDOW_MS, fsync="interval", fsync_interval_ms=200,
+                               snapshot_interval_s=3600)
+    store.recover()
+    store.observe("1111", int(time.time() * 1000))
+    store.observe("1111", int(time.time() * 1000))  # inside the interval: left unsynced
+    assert store._unsynced
+
+    deadline = time.monotonic() + 2
+    while store._unsynced and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not store._unsynced
+    store.close()
+
+
+def test_backfilled_events_are_retained(tmp_path):
+    store = _open(tmp_path, retention_ms=60000)
+    store.observe("1111", 1420070400000)  # 2015-01-01
+    store.close()
+
+    recovered = _open(tmp_path)
+    assert recovered.state == {"1111": [1420070400000]}
+    recovered.close()
+
+
+@pytest.fixture
+def tz_east_of_utc():
+    previous = os.environ.get("TZ")
+    os.environ["TZ"] = "Asia/Tokyo"
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ["TZ"]
+    else:
+        os.environ["TZ"] = previous
+    time.tzset()
+
+
+def test_utc_event_timestamps_survive_restart_east_of_utc(tmp_path, monkeypatch, tz_east_of_utc):
+    import fraud_detection_service as service
+
+    monkeypatch.setattr(service, "state_store", None)
+    monkeypatch.setattr(service, "_recent_by_card_tail", {})
+    monkeypatch.setenv("RULE_STATE_DIR", str(tmp_path))
+    monkeypatch.setenv("RULE_STATE_FSYNC", "never")
+    service.init_rule_state()
+
+    ts = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+    for tail in ("1111", "2222"):
+        service.classify_rules({"card_number": f"****-****-****-{tail}", "amount": 10, "ts": ts})
+    service.state_store.close()
+
+    recovered = _open(tmp_path)
+    assert set(recovered.state) == {"1111", "2222"}
+    recovered.close()